@@ -65,6 +65,8 @@ static std::optional<std::string> specifyShape(
         return "input dimension must be 4";
     }
 
+    // pin (possibly symbolic) dimensions to the tile shape so that
+    // the execution providers can specialize kernels for it
     input_shape->mutable_dim(n_idx)->set_dim_value(batch);
     input_shape->mutable_dim(h_idx)->set_dim_value(tile_h);
     input_shape->mutable_dim(w_idx)->set_dim_value(tile_w);
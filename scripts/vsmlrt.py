@@ -20,7 +20,8 @@ import copy
 from dataclasses import dataclass, field
 import enum
 from fractions import Fraction
-import math
+import functools
+import json
 import os
 import os.path
 import platform
@@ -97,6 +98,10 @@ class Backend:
         fp16: bool = False
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
         output_format: int = 0 # 0: fp32, 1: fp16
+        graph_optimization_level: int = 99 # 0: disabled, 1: basic, 2: extended, 99: all
+        int8: bool = False # use pre-quantized "*.int8.onnx" models
+        enable_cpu_mem_arena: bool = True
+        enable_mem_pattern: bool = False
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -107,6 +112,14 @@ class Backend:
 
         basic performance tuning:
         set fp16 = True (on RTX GPUs)
+        set prefer_nhwc = True along with fp16 = True (on RTX GPUs, requires onnxruntime 1.18+)
+        increase num_streams (to overlap transfers and computation of different frames)
+        set use_cuda_graph = True (not supported by all models)
+        set auto_tile = True to let Waifu2x and DPIR pick tiles from device memory,
+            probed results are cached in ~/.cache/vsmlrt (delete it to probe again)
+        set enable_cpu_mem_arena = False to reduce memory usage when creating many instances
+        use Backend.TRT instead for TensorRT acceleration,
+            built engines are cached on disk (see `engine_folder`)
 
         Semantics of `fp16`:
             Enabling `fp16` will use a built-in quantization that converts a fp32 onnx to a fp16 onnx.
@@ -131,6 +144,11 @@ class Backend:
         prefer_nhwc: bool = False
         output_format: int = 0 # 0: fp32, 1: fp16
         tf32: bool = False
+        graph_optimization_level: int = 99 # 0: disabled, 1: basic, 2: extended, 99: all
+        auto_tile: bool = False # used by Waifu2x and DPIR when tiles and tilesize are None
+        enable_cpu_mem_arena: bool = True
+        enable_mem_pattern: bool = False # not supported with use_cuda_graph
+        arena_extend_strategy: typing.Literal["kNextPowerOfTwo", "kSameAsRequested"] = "kSameAsRequested"
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -142,6 +160,7 @@ class Backend:
         basic performance tuning:
         set bf16 = True (on Zen4)
         increase num_streams
+        set cache_dir to reuse compiled models across runs
         """
 
         fp16: bool = False
@@ -150,6 +169,8 @@ class Backend:
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
         bf16: bool = False
         num_threads: int = 0
+        cache_dir: typing.Optional[str] = None
+        int8: bool = False # use pre-quantized "*.int8.onnx" models
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -208,12 +229,17 @@ class Backend:
         basic performance tuning:
         set fp16 = True
         increase num_streams
+        set cache_dir to reuse compiled models across runs
+        set auto_tile = True to let Waifu2x and DPIR pick tiles from device memory,
+            probed results are cached in ~/.cache/vsmlrt (delete it to probe again)
         """
 
         fp16: bool = False
         num_streams: typing.Union[int, str] = 1
         device_id: int = 0
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
+        cache_dir: typing.Optional[str] = None
+        auto_tile: bool = False # used by Waifu2x and DPIR when tiles and tilesize are None
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -225,19 +251,26 @@ class Backend:
         basic performance tuning:
         set fp16 = True (on modern GPUs)
         increase num_streams
+        set auto_tile = True to let Waifu2x and DPIR pick tiles from device memory,
+            probed results are cached in ~/.cache/vsmlrt (delete it to probe again)
         """
 
         fp16: bool = False
         device_id: int = 0
         num_streams: int = 1
         output_format: int = 0 # 0: fp32, 1: fp16
+        auto_tile: bool = False # used by Waifu2x and DPIR when tiles and tilesize are None
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
 
     @dataclass(frozen=False)
     class ORT_DML:
-        """ backend for directml (d3d12) devices """
+        """ backend for directml (d3d12) devices
+
+        set auto_tile = True to let Waifu2x and DPIR pick tiles from device memory,
+            probed results are cached in ~/.cache/vsmlrt (delete it to probe again)
+        """
 
         device_id: int = 0
         num_streams: int = 1
@@ -245,6 +278,7 @@ class Backend:
         fp16: bool = False
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
         output_format: int = 0 # 0: fp32, 1: fp16
+        auto_tile: bool = False # used by Waifu2x and DPIR when tiles and tilesize are None
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -351,6 +385,30 @@ backendT = typing.Union[
 fallback_backend: typing.Optional[backendT] = None
 
 
+# backends that support probing for the largest tile size, see _auto_tiles()
+_auto_tile_backends = (Backend.ORT_CUDA, Backend.ORT_DML, Backend.OV_GPU, Backend.NCNN_VK)
+
+# gpu backends that run pre/post-processing folded into the serialized network,
+# which saves host-device transfers but costs an onnx rewrite on each call
+_fuse_backends = (Backend.ORT_CUDA, Backend.ORT_DML, Backend.OV_GPU)
+
+# lowercase fragments of the out of memory errors reported by the runtimes
+_allocation_error_patterns = (
+    "out of memory", # cuda
+    "out_of_memory", "out_of_device_memory", # vulkan
+    "outofmemory", # directml
+    "failed to allocate", "bad_alloc", "allocation fail", "alloc_failed",
+    "out of gpu resources" # openvino
+)
+
+
+# default instances for backends passed as classes, e.g. `backend=Backend.ORT_CUDA`
+# they are deep-copied in init_backend() and never modified in place
+_default_backends: typing.Dict[type, backendT] = {
+    cls: cls() for cls in typing.get_args(backendT)
+}
+
+
 @enum.unique
 class Waifu2xModel(enum.IntEnum):
     anime_style_art = 0
@@ -366,6 +424,77 @@ class Waifu2xModel(enum.IntEnum):
     swin_unet_art_scan = 10 # 20230504
 
 
+_waifu2x_model_names: typing.Tuple[str, ...] = tuple(Waifu2xModel.__members__)
+_waifu2x_overlaps: typing.Tuple[int, ...] = (8, 8, 8, 8, 8, 4, 4, 4, 4, 4, 4)
+
+
+def _make_waifu2x_network_paths() -> typing.Dict[typing.Tuple[int, int, int], str]:
+    """ maps all supported (model, noise, scale) to the network path relative to models_path """
+
+    network_paths = {}
+
+    for model, folder_name in enumerate(_waifu2x_model_names):
+        folder_path = os.path.join("waifu2x", folder_name)
+
+        for noise in range(-1, 4):
+            if model == 0 and noise == 0:
+                continue
+
+            for scale in ((1, 2) if model < 7 else (1, 2, 4)):
+                if model in (0, 1, 2):
+                    if noise == -1:
+                        model_name = "scale2.0x_model.onnx"
+                    else:
+                        model_name = f"noise{noise}_model.onnx"
+                elif model in (3, 4, 5):
+                    if noise == -1:
+                        model_name = "scale2.0x_model.onnx"
+                    else:
+                        model_name = f"noise{noise}_scale2.0x_model.onnx"
+                elif model == 6:
+                    if scale == 1:
+                        scale_name = ""
+                    else:
+                        scale_name = "scale2.0x_"
+
+                    if noise == -1:
+                        model_name = "scale2.0x_model.onnx"
+                    else:
+                        model_name = f"noise{noise}_{scale_name}model.onnx"
+                elif model == 7:
+                    if scale == 1:
+                        scale_name = ""
+                    elif scale == 2:
+                        scale_name = "scale2x"
+                    else:
+                        scale_name = "scale4x"
+
+                    if noise == -1:
+                        if scale == 1:
+                            # swin_unet model for "noise == -1" and "scale == 1" does not exist
+                            continue
+
+                        model_name = f"{scale_name}.onnx"
+                    else:
+                        if scale == 1:
+                            model_name = f"noise{noise}.onnx"
+                        else:
+                            model_name = f"noise{noise}_{scale_name}.onnx"
+                else:
+                    scale_name = "scale4x"
+                    if noise == -1:
+                        model_name = f"{scale_name}.onnx"
+                    else:
+                        model_name = f"noise{noise}_{scale_name}.onnx"
+
+                network_paths[(model, noise, scale)] = os.path.join(folder_path, model_name)
+
+    return network_paths
+
+
+_waifu2x_network_paths: typing.Dict[typing.Tuple[int, int, int], str] = _make_waifu2x_network_paths()
+
+
 def Waifu2x(
     clip: vs.VideoNode,
     noise: typing.Literal[-1, 0, 1, 2, 3] = -1,
@@ -375,7 +504,8 @@ def Waifu2x(
     overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
     model: Waifu2xModel = Waifu2xModel.cunet,
     backend: backendT = Backend.OV_CPU(),
-    preprocess: bool = True
+    preprocess: bool = True,
+    batch_size: int = 1 # experimental
 ) -> vs.VideoNode:
 
     func_name = "vsmlrt.Waifu2x"
@@ -386,13 +516,13 @@ def Waifu2x(
     if clip.format.sample_type != vs.FLOAT or clip.format.bits_per_sample not in [16, 32]:
         raise ValueError(f"{func_name}: only constant format 16/32 bit float input supported")
 
-    if not isinstance(noise, int) or noise not in range(-1, 4):
+    if not isinstance(noise, int) or not -1 <= noise <= 3:
         raise ValueError(f'{func_name}: "noise" must be -1, 0, 1, 2, or 3')
 
     if not isinstance(scale, int) or scale not in (1, 2, 4):
         raise ValueError(f'{func_name}: "scale" must be 1, 2 or 4')
 
-    if not isinstance(model, int) or model not in Waifu2xModel.__members__.values():
+    if not isinstance(model, int) or not 0 <= model < len(_waifu2x_model_names):
         raise ValueError(f'{func_name}: invalid "model"')
 
     if model == 0 and noise == 0:
@@ -401,7 +531,7 @@ def Waifu2x(
             ' does not support noise reduction level 0'
         )
 
-    if model in range(7) and scale not in (1, 2):
+    if model < 7 and scale not in (1, 2):
         raise ValueError(f'{func_name}: "scale" must be 1 or 2')
 
     if model == 0:
@@ -411,7 +541,7 @@ def Waifu2x(
         raise ValueError(f'{func_name}: "clip" must be of RGB color family')
 
     if overlap is None:
-        overlap_w = overlap_h = [8, 8, 8, 8, 8, 4, 4, 4, 4, 4, 4][model]
+        overlap_w = overlap_h = _waifu2x_overlaps[model]
     elif isinstance(overlap, int):
         overlap_w = overlap_h = overlap
     else:
@@ -422,20 +552,83 @@ def Waifu2x(
     else:
         multiple = 1
 
+    try:
+        network_path = os.path.join(models_path, _waifu2x_network_paths[(model, noise, scale)])
+    except KeyError:
+        raise ValueError("swin_unet model for \"noise == -1\" and \"scale == 1\" does not exist") from None
+
     width, height = clip.width, clip.height
-    if preprocess and model in (0, 1, 2):
-        # emulating cv2.resize(interpolation=cv2.INTER_CUBIC)
-        clip = core.resize.Bicubic(
-            clip,
-            width * 2, height * 2,
-            filter_param_a=0, filter_param_b=0.75
+
+    # the network operates on a 2x upsampled clip
+    upsample = preprocess and model in (0, 1, 2)
+
+    # the output is to be downsampled to the size of the input clip
+    downsample = scale == 1 and (upsample or model in (3, 4, 5) or (model == 6 and noise == -1))
+
+    backend_type = backend if isinstance(backend, type) else type(backend)
+
+    # keep the resampling on the gpu to avoid extra host-device transfers
+    fuse_upsample = upsample and issubclass(backend_type, Backend.ORT_CUDA)
+
+    # the output to input size ratio of the network must be an integer
+    fuse_downsample = (
+        downsample and (fuse_upsample or not upsample) and
+        issubclass(backend_type, _fuse_backends)
+    )
+
+    fused_network = None
+    if fuse_upsample or fuse_downsample:
+        fused_network = _waifu2x_fuse_resample(
+            network_path,
+            channels=clip.format.num_planes,
+            upsample=fuse_upsample,
+            downsample=fuse_downsample
         )
 
-    (tile_w, tile_h), (overlap_w, overlap_h) = calc_tilesize(
-        tiles=tiles, tilesize=tilesize,
-        width=clip.width, height=clip.height,
+    if fused_network is None:
+        fuse_upsample = False
+
+    if fuse_upsample:
+        # the bicubic upsampling reads 2 pixels beyond each side of a tile,
+        # which are clamped at the tile border and have to be cropped
+        network_width, network_height = width, height
+        network_overlap = ((overlap_w + 1) // 2 + 2, (overlap_h + 1) // 2 + 2)
+
+        if tilesize is None:
+            network_tilesize = None
+        else:
+            # specified for the upsampled clip
+            tilesize_w, tilesize_h = (tilesize, tilesize) if isinstance(tilesize, int) else tilesize
+            network_tilesize = (
+                min((tilesize_w + 1) // 2 + 4, width),
+                min((tilesize_h + 1) // 2 + 4, height)
+            )
+    else:
+        network_width = width * 2 if upsample else width
+        network_height = height * 2 if upsample else height
+        network_overlap = (overlap_w, overlap_h)
+        network_tilesize = tilesize
+
+    if (
+        tiles is None and tilesize is None and
+        isinstance(backend, _auto_tile_backends) and backend.auto_tile
+    ):
+        tiles = _auto_tiles(
+            clips=[clip],
+            network_path=network_path if fused_network is None else fused_network,
+            width=network_width, height=network_height,
+            overlap_w=network_overlap[0], overlap_h=network_overlap[1],
+            multiple=multiple,
+            backend=backend,
+            path_is_serialization=fused_network is not None,
+            batch_size=batch_size
+        )
+
+    (tile_w, tile_h), network_overlap = calc_tilesize(
+        tiles=tiles, tilesize=network_tilesize,
+        width=network_width, height=network_height,
         multiple=multiple,
-        overlap_w=overlap_w, overlap_h=overlap_h
+        overlap_w=network_overlap[0], overlap_h=network_overlap[1]
     )
 
     if tile_w % multiple != 0 or tile_h % multiple != 0:
@@ -448,68 +641,53 @@ def Waifu2x(
         trt_opt_shapes=(tile_w, tile_h)
     )
 
-    folder_path = os.path.join(
-        models_path,
-        "waifu2x",
-        tuple(Waifu2xModel.__members__)[model]
-    )
-
-    if model in (0, 1, 2):
-        if noise == -1:
-            model_name = "scale2.0x_model.onnx"
-        else:
-            model_name = f"noise{noise}_model.onnx"
-    elif model in (3, 4, 5):
-        if noise == -1:
-            model_name = "scale2.0x_model.onnx"
-        else:
-            model_name = f"noise{noise}_scale2.0x_model.onnx"
-    elif model == 6:
-        if scale == 1:
-            scale_name = ""
-        else:
-            scale_name = "scale2.0x_"
-
-        if noise == -1:
-            model_name = "scale2.0x_model.onnx"
-        else:
-            model_name = f"noise{noise}_{scale_name}model.onnx"
-    elif model == 7:
-        if scale == 1:
-            scale_name = ""
-        elif scale == 2:
-            scale_name = "scale2x"
-        elif scale == 4:
-            scale_name = "scale4x"
+    fused_clip = None
+    if fused_network is not None:
+        try:
+            fused_clip = _inference(
+                clips=[clip], network_path=fused_network,
+                overlap=network_overlap, tilesize=(tile_w, tile_h),
+                backend=backend,
+                path_is_serialization=True,
+                batch_size=batch_size
+            )
+        except Exception as e:
+            # the fallback backend runs the original network
+            if fallback_backend is None:
+                raise
 
-        if noise == -1:
-            if scale == 1:
-                raise ValueError("swin_unet model for \"noise == -1\" and \"scale == 1\" does not exist")
+            import logging
+            logger = logging.getLogger("vsmlrt")
+            logger.warning(f'"{backend}" fails with the fused network ({e}), trying the original network')
 
-            model_name = f"{scale_name}.onnx"
-        else:
-            if scale == 1:
-                model_name = f"noise{noise}.onnx"
-            else:
-                model_name = f"noise{noise}_{scale_name}.onnx"
-    elif model in (8, 9, 10):
-        scale_name = "scale4x"
-        if noise == -1:
-            model_name = f"{scale_name}.onnx"
-        else:
-            model_name = f"noise{noise}_{scale_name}.onnx"
+    if fused_clip is not None:
+        clip = typing.cast(vs.VideoNode, fused_clip)
     else:
-        raise ValueError(f"{func_name}: inavlid model {model}")
+        if fuse_upsample:
+            # the original network runs on the upsampled clip
+            (tile_w, tile_h), network_overlap = calc_tilesize(
+                tiles=tiles, tilesize=tilesize,
+                width=width * 2, height=height * 2,
+                multiple=multiple,
+                overlap_w=overlap_w, overlap_h=overlap_h
+            )
 
-    network_path = os.path.join(folder_path, model_name)
+        if upsample:
+            # emulating cv2.resize(interpolation=cv2.INTER_CUBIC)
+            clip = core.resize.Bicubic(
+                clip,
+                width * 2, height * 2,
+                filter_param_a=0, filter_param_b=0.75
+            )
 
-    clip = inference_with_fallback(
-        clips=[clip], network_path=network_path,
-        overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
-        backend=backend
-    )
+        clip = inference_with_fallback(
+            clips=[clip], network_path=network_path,
+            overlap=network_overlap, tilesize=(tile_w, tile_h),
+            backend=backend,
+            batch_size=batch_size
+        )
 
-    if model in range(8) and scale == 1 and clip.width // width == 2:
+    if model < 8 and scale == 1 and clip.width // width == 2:
         # emulating cv2.resize(interpolation=cv2.INTER_CUBIC)
         # cr: @AkarinVS
 
@@ -528,6 +706,126 @@ def Waifu2x(
     return clip
 
 
+def _waifu2x_fuse_resample(
+    network_path: str,
+    channels: int,
+    upsample: bool,
+    downsample: bool
+) -> typing.Optional[bytes]:
+    """ folds the resampling around the waifu2x network into the onnx
+
+    upsample: prepends the 2x bicubic upsampling of the input
+    downsample: appends the 0.5x impulse downsampling of the output
+
+    Returns the onnx serialization,
+    or None if the onnx package is not available or the opset is too old.
+    """
+
+    if not os.path.exists(network_path):
+        return None
+
+    try:
+        import numpy as np
+        import onnx
+    except ImportError:
+        return None
+
+    model = onnx.load(network_path)
+
+    opset = max(
+        (opset.version for opset in model.opset_import if opset.domain in ("", "ai.onnx")),
+        default=0
+    )
+    if opset < 11:
+        return None
+
+    graph = model.graph
+    input_name = graph.input[0].name
+    output_name = graph.output[0].name
+
+    for node in graph.node:
+        for i, name in enumerate(node.input):
+            if upsample and name == input_name:
+                node.input[i] = "_vsmlrt_upsampled"
+            elif downsample and name == output_name:
+                node.input[i] = "_vsmlrt_network_output"
+
+        for i, name in enumerate(node.output):
+            if downsample and name == output_name:
+                node.output[i] = "_vsmlrt_network_output"
+
+    # shapes of intermediate tensors are changed
+    del graph.value_info[:]
+
+    if upsample:
+        # emulating cv2.resize(interpolation=cv2.INTER_CUBIC)
+        graph.initializer.extend([
+            onnx.numpy_helper.from_array(
+                np.zeros((0,), dtype=np.float32), "_vsmlrt_upsample_roi"
+            ),
+            onnx.numpy_helper.from_array(
+                np.array([1, 1, 2, 2], dtype=np.float32), "_vsmlrt_upsample_scales"
+            )
+        ])
+        graph.node.insert(0, onnx.helper.make_node(
+            op_type="Resize",
+            inputs=[input_name, "_vsmlrt_upsample_roi", "_vsmlrt_upsample_scales"],
+            outputs=["_vsmlrt_upsampled"],
+            mode="cubic",
+            cubic_coeff_a=-0.75,
+            coordinate_transformation_mode="half_pixel"
+        ))
+
+    if downsample:
+        # equivalent to fmtc.resample(
+        #     scale=0.5, kernel="impulse", impulse=[-0.1875, 1.375, -0.1875], kovrspl=2
+        # )
+        if graph.output[0].type.tensor_type.elem_type == onnx.TensorProto.FLOAT16:
+            dtype = np.float16
+        else:
+            dtype = np.float32
+
+        kernel = np.array([-0.09375, 0.59375, 0.59375, -0.09375], dtype=dtype)
+        graph.initializer.extend([
+            onnx.numpy_helper.from_array(
+                np.array([0, 0, 1, 1, 0, 0, 1, 1], dtype=np.int64), "_vsmlrt_downsample_pads"
+            ),
+            onnx.numpy_helper.from_array(
+                np.tile(kernel.reshape(1, 1, 4, 1), (channels, 1, 1, 1)), "_vsmlrt_downsample_kernel_v"
+            ),
+            onnx.numpy_helper.from_array(
+                np.tile(kernel.reshape(1, 1, 1, 4), (channels, 1, 1, 1)), "_vsmlrt_downsample_kernel_h"
+            )
+        ])
+        graph.node.extend([
+            onnx.helper.make_node(
+                op_type="Pad",
+                inputs=["_vsmlrt_network_output", "_vsmlrt_downsample_pads"],
+                outputs=["_vsmlrt_downsample_padded"],
+                mode="edge"
+            ),
+            onnx.helper.make_node(
+                op_type="Conv",
+                inputs=["_vsmlrt_downsample_padded", "_vsmlrt_downsample_kernel_v"],
+                outputs=["_vsmlrt_downsampled_v"],
+                group=channels,
+                strides=[2, 1]
+            ),
+            onnx.helper.make_node(
+                op_type="Conv",
+                inputs=["_vsmlrt_downsampled_v", "_vsmlrt_downsample_kernel_h"],
+                outputs=[output_name],
+                group=channels,
+                strides=[1, 2]
+            )
+        ])
+
+        for dim in graph.output[0].type.tensor_type.shape.dim[2:]:
+            dim.ClearField("dim_value")
+
+    return model.SerializeToString()
+
+
 @enum.unique
 class DPIRModel(enum.IntEnum):
     drunet_gray = 0
@@ -536,6 +834,13 @@ class DPIRModel(enum.IntEnum):
     drunet_deblocking_color = 3
 
 
+_dpir_model_names: typing.Tuple[str, ...] = tuple(DPIRModel.__members__)
+_dpir_color_families: typing.Tuple[vs.ColorFamily, ...] = (vs.GRAY, vs.RGB, vs.GRAY, vs.RGB)
+_dpir_network_paths: typing.Tuple[str, ...] = tuple(
+    os.path.join("dpir", f"{name}.onnx") for name in _dpir_model_names
+)
+
+
 def DPIR(
     clip: vs.VideoNode,
     strength: typing.Optional[typing.Union[typing.SupportsFloat, vs.VideoNode]],
@@ -543,7 +848,8 @@ def DPIR(
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
     overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
     model: DPIRModel = DPIRModel.drunet_gray,
-    backend: backendT = Backend.OV_CPU()
+    backend: backendT = Backend.OV_CPU(),
+    batch_size: int = 1 # experimental
 ) -> vs.VideoNode:
 
     func_name = "vsmlrt.DPIR"
@@ -554,13 +860,13 @@ def DPIR(
     if clip.format.sample_type != vs.FLOAT or clip.format.bits_per_sample not in [16, 32]:
         raise ValueError(f"{func_name}: only constant format 16/32 bit float input supported")
 
-    if not isinstance(model, int) or model not in DPIRModel.__members__.values():
+    if not isinstance(model, int) or not 0 <= model < len(_dpir_model_names):
         raise ValueError(f'{func_name}: invalid "model"')
 
-    if model in [0, 2] and clip.format.color_family != vs.GRAY:
-        raise ValueError(f'{func_name}: "clip" must be of GRAY color family')
-    elif model in [1, 3] and clip.format.color_family != vs.RGB:
-        raise ValueError(f'{func_name}: "clip" must be of RGB color family')
+    if clip.format.color_family != _dpir_color_families[model]:
+        raise ValueError(
+            f'{func_name}: "clip" must be of {_dpir_color_families[model].name} color family'
+        )
 
     if strength is None:
         strength = 5.0
@@ -576,15 +882,13 @@ def DPIR(
         if strength.num_frames != clip.num_frames:
             raise ValueError(f'{func_name}: "strength" must be of the same length as "clip"')
 
-        strength = _expr(strength, "x 255 /", format=gray_format)
+        strength = _expr(strength, "x 0.00392156862745098 *", format=gray_format) # x / 255
     else:
         try:
             strength = float(strength)
         except TypeError as e:
             raise TypeError(f'{func_name}: "strength" must be a float or a clip') from e
 
-        strength = core.std.BlankClip(clip, format=gray_format, color=strength / 255, keep=True)
-
     if overlap is None:
         overlap_w = overlap_h = 16
     elif isinstance(overlap, int):
@@ -594,6 +898,44 @@ def DPIR(
 
     multiple = 8
 
+    network_path = os.path.join(models_path, _dpir_network_paths[model])
+
+    backend_type = backend if isinstance(backend, type) else type(backend)
+
+    fused_network = None
+    if not isinstance(strength, vs.VideoNode) and issubclass(backend_type, _fuse_backends):
+        # avoid transferring a constant plane to the device for each tile
+        fused_network = _dpir_fuse_strength(network_path, strength / 255)
+
+    if (
+        tiles is None and tilesize is None and
+        isinstance(backend, _auto_tile_backends) and backend.auto_tile
+    ):
+        if fused_network is not None:
+            tiles = _auto_tiles(
+                clips=[clip], network_path=fused_network,
+                width=clip.width, height=clip.height,
+                overlap_w=overlap_w, overlap_h=overlap_h,
+                multiple=multiple,
+                backend=backend,
+                path_is_serialization=True,
+                batch_size=batch_size
+            )
+        else:
+            if isinstance(strength, vs.VideoNode):
+                strength_template = strength
+            else:
+                strength_template = core.std.BlankClip(clip, format=gray_format, length=1)
+
+            tiles = _auto_tiles(
+                clips=[clip, strength_template], network_path=network_path,
+                width=clip.width, height=clip.height,
+                overlap_w=overlap_w, overlap_h=overlap_h,
+                multiple=multiple,
+                backend=backend,
+                batch_size=batch_size
+            )
+
     (tile_w, tile_h), (overlap_w, overlap_h) = calc_tilesize(
         tiles=tiles, tilesize=tilesize,
         width=clip.width, height=clip.height,
@@ -617,21 +959,121 @@ def DPIR(
             "--layerPrecisions=Conv_123:fp32"
         ])
 
-    network_path = os.path.join(
-        models_path,
-        "dpir",
-        f"{tuple(DPIRModel.__members__)[model]}.onnx"
-    )
+    fused_clip = None
+    if fused_network is not None:
+        try:
+            fused_clip = _inference(
+                clips=[clip], network_path=fused_network,
+                overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
+                backend=backend,
+                path_is_serialization=True,
+                batch_size=batch_size
+            )
+        except Exception as e:
+            # the fallback backend runs the original network
+            if fallback_backend is None:
+                raise
 
-    clip = inference_with_fallback(
-        clips=[clip, strength], network_path=network_path,
-        overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
-        backend=backend
-    )
+            import logging
+            logger = logging.getLogger("vsmlrt")
+            logger.warning(f'"{backend}" fails with the fused network ({e}), trying the original network')
+
+    if fused_clip is not None:
+        clip = typing.cast(vs.VideoNode, fused_clip)
+    else:
+        if not isinstance(strength, vs.VideoNode):
+            strength = core.std.BlankClip(clip, format=gray_format, color=strength / 255, keep=True)
+
+        clip = inference_with_fallback(
+            clips=[clip, strength], network_path=network_path,
+            overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
+            backend=backend,
+            batch_size=batch_size
+        )
 
     return clip
 
 
+def _dpir_fuse_strength(
+    network_path: str,
+    strength: float
+) -> typing.Optional[bytes]:
+    """ replaces the strength plane of the dpir network input by a constant
+
+    Returns the onnx serialization,
+    or None if the onnx package is not available or the opset is too old.
+    """
+
+    if not os.path.exists(network_path):
+        return None
+
+    try:
+        import numpy as np
+        import onnx
+    except ImportError:
+        return None
+
+    model = onnx.load(network_path)
+
+    opset = max(
+        (opset.version for opset in model.opset_import if opset.domain in ("", "ai.onnx")),
+        default=0
+    )
+    if opset < 10:
+        return None
+
+    graph = model.graph
+    input_name = graph.input[0].name
+
+    for node in graph.node:
+        for i, name in enumerate(node.input):
+            if name == input_name:
+                node.input[i] = "_vsmlrt_network_input"
+
+    channels_dim = graph.input[0].type.tensor_type.shape.dim[1]
+    if channels_dim.HasField("dim_value"):
+        channels_dim.dim_value -= 1
+
+    if graph.input[0].type.tensor_type.elem_type == onnx.TensorProto.FLOAT16:
+        dtype = np.float16
+    else:
+        dtype = np.float32
+
+    graph.initializer.extend([
+        onnx.numpy_helper.from_array(np.array([0], dtype=np.int64), "_vsmlrt_plane_starts"),
+        onnx.numpy_helper.from_array(np.array([1], dtype=np.int64), "_vsmlrt_plane_ends"),
+        onnx.numpy_helper.from_array(np.array([1], dtype=np.int64), "_vsmlrt_plane_axes"),
+        onnx.numpy_helper.from_array(
+            np.full((1, 1, 1, 1), strength, dtype=dtype), "_vsmlrt_strength_value"
+        )
+    ])
+    graph.node[0:0] = [
+        onnx.helper.make_node(
+            op_type="Slice",
+            inputs=[input_name, "_vsmlrt_plane_starts", "_vsmlrt_plane_ends", "_vsmlrt_plane_axes"],
+            outputs=["_vsmlrt_plane"]
+        ),
+        onnx.helper.make_node(
+            op_type="Shape",
+            inputs=["_vsmlrt_plane"],
+            outputs=["_vsmlrt_plane_shape"]
+        ),
+        onnx.helper.make_node(
+            op_type="Expand",
+            inputs=["_vsmlrt_strength_value", "_vsmlrt_plane_shape"],
+            outputs=["_vsmlrt_strength"]
+        ),
+        onnx.helper.make_node(
+            op_type="Concat",
+            inputs=[input_name, "_vsmlrt_strength"],
+            outputs=["_vsmlrt_network_input"],
+            axis=1
+        )
+    ]
+
+    return model.SerializeToString()
+
+
 @enum.unique
 class RealESRGANModel(enum.IntEnum):
     # v2
@@ -2538,8 +2980,26 @@ def tensorrt_rtx(
     return engine_path
 
 
+@functools.lru_cache(maxsize=128)
 def calc_size(width: int, tiles: int, overlap: int, multiple: int = 1) -> int:
-    return math.ceil((width + 2 * overlap * (tiles - 1)) / (tiles * multiple)) * multiple
+    q = tiles * multiple
+    return (width + 2 * overlap * (tiles - 1) + q - 1) // q * multiple
+
+
+@functools.lru_cache(maxsize=128)
+def calc_tiles(
+    width: int,
+    height: int,
+    tiles_w: int,
+    tiles_h: int,
+    overlap_w: int,
+    overlap_h: int,
+    multiple: int = 1
+) -> typing.Tuple[int, int]:
+    return (
+        calc_size(width, tiles_w, overlap_w, multiple),
+        calc_size(height, tiles_h, overlap_h, multiple)
+    )
 
 
 def calc_tilesize(
@@ -2558,12 +3018,11 @@ def calc_tilesize(
             overlap_h = 0
             tile_w = width
             tile_h = height
-        elif isinstance(tiles, int):
-            tile_w = calc_size(width, tiles, overlap_w, multiple)
-            tile_h = calc_size(height, tiles, overlap_h, multiple)
         else:
-            tile_w = calc_size(width, tiles[0], overlap_w, multiple)
-            tile_h = calc_size(height, tiles[1], overlap_h, multiple)
+            tiles_w, tiles_h = (tiles, tiles) if isinstance(tiles, int) else tiles
+            tile_w, tile_h = calc_tiles(
+                width, height, tiles_w, tiles_h, overlap_w, overlap_h, multiple
+            )
     elif isinstance(tilesize, int):
         tile_w = tilesize
         tile_h = tilesize
@@ -2573,31 +3032,133 @@ def calc_tilesize(
     return (tile_w, tile_h), (overlap_w, overlap_h)
 
 
+def _auto_tiles(
+    clips: typing.List[vs.VideoNode],
+    network_path: typing.Union[bytes, str],
+    width: int,
+    height: int,
+    overlap_w: int,
+    overlap_h: int,
+    multiple: int,
+    backend: backendT,
+    path_is_serialization: bool = False,
+    batch_size: int = 1
+) -> typing.Optional[int]:
+    """ finds the smallest number of tiles (per axis) that fits in device memory
+
+    The tile size is halved until a test frame is processed without allocation failures.
+    The result is cached in ~/.cache/vsmlrt. Returns None if no tiling is required.
+    """
+
+    if path_is_serialization:
+        checksum = zlib.adler32(typing.cast(bytes, network_path))
+    else:
+        if not os.path.exists(network_path):
+            return None
+
+        with open(network_path, "rb") as file:
+            checksum = zlib.adler32(file.read())
+
+    identity = (
+        f"{width}x{height}_overlap{overlap_w}x{overlap_h}_multiple{multiple}_batch{batch_size}" +
+        "".join(f"_{clip.format.name}" for clip in clips) +
+        f"_{backend}" +
+        f"_{_runtime_version(backend)}" +
+        f"_{checksum:x}"
+    )
+
+    cache_path = os.path.join(
+        os.path.expanduser("~"), ".cache", "vsmlrt",
+        f"tiles_{zlib.adler32(identity.encode()):08x}.json"
+    )
+
+    try:
+        with open(cache_path) as file:
+            cache = json.load(file)
+
+        if cache["identity"] == identity:
+            return cache["tiles"] if cache["tiles"] > 1 else None
+    except (OSError, ValueError, KeyError):
+        pass
+
+    tiles = 1
+    while True:
+        if tiles == 1:
+            tile_w, tile_h = width, height
+        else:
+            tile_w, tile_h = calc_tiles(
+                width, height, tiles, tiles, overlap_w, overlap_h, multiple
+            )
+
+            if tile_w <= 2 * overlap_w or tile_h <= 2 * overlap_h:
+                # let the actual inference report the error
+                return None
+
+        try:
+            probe = _inference(
+                clips=[
+                    core.std.BlankClip(clip, width=tile_w, height=tile_h, length=1, keep=True)
+                    for clip in clips
+                ],
+                network_path=network_path,
+                overlap=(0, 0), tilesize=(tile_w, tile_h),
+                backend=init_backend(backend=backend, trt_opt_shapes=(tile_w, tile_h)),
+                path_is_serialization=path_is_serialization,
+                batch_size=batch_size
+            )
+            typing.cast(vs.VideoNode, probe).get_frame(0)
+
+            # release the session before returning
+            probe = None
+            break
+        except vs.Error as e:
+            message = str(e).lower()
+            if not any(pattern in message for pattern in _allocation_error_patterns):
+                raise
+
+            # release the failed session before creating a smaller one
+            probe = None
+
+            tiles *= 2
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "w") as file:
+            json.dump(dict(identity=identity, tiles=tiles), file)
+    except OSError:
+        pass
+
+    return tiles if tiles > 1 else None
+
+
+def _runtime_version(backend: backendT) -> str:
+    """ identifies the runtime and driver used by an auto_tile backend """
+
+    if isinstance(backend, (Backend.ORT_CUDA, Backend.ORT_DML)):
+        version = core.ort.Version()
+        return (
+            "ort-" + version.get("onnxruntime_version", b"0.0.0").decode() +
+            "_cuda-" + version.get("cuda_runtime_version", b"0").decode()
+        )
+    elif isinstance(backend, Backend.OV_GPU):
+        return "ov-" + core.ov.Version().get("openvino_version", b"0.0.0").decode()
+    elif isinstance(backend, Backend.NCNN_VK):
+        device_properties = core.ncnn.DeviceProperties(backend.device_id)
+        return (
+            "ncnn-" + core.ncnn.Version().get("ncnn_version", b"0").decode() +
+            f"_driver-{device_properties.get('driver_version', 0)}"
+        )
+    else:
+        return ""
+
+
 def init_backend(
     backend: backendT,
     trt_opt_shapes: typing.Tuple[int, int]
 ) -> backendT:
 
-    if backend is Backend.ORT_CPU: # type: ignore
-        backend = Backend.ORT_CPU()
-    elif backend is Backend.ORT_CUDA: # type: ignore
-        backend = Backend.ORT_CUDA()
-    elif backend is Backend.OV_CPU: # type: ignore
-        backend = Backend.OV_CPU()
-    elif backend is Backend.TRT: # type: ignore
-        backend = Backend.TRT()
-    elif backend is Backend.OV_GPU: # type: ignore
-        backend = Backend.OV_GPU()
-    elif backend is Backend.NCNN_VK: # type: ignore
-        backend = Backend.NCNN_VK()
-    elif backend is Backend.ORT_DML: # type: ignore
-        backend = Backend.ORT_DML()
-    elif backend is Backend.MIGX: # type: ignore
-        backend = Backend.MIGX()
-    elif backend is Backend.OV_NPU: # type: ignore
-        backend = Backend.OV_NPU()
-    elif backend is Backend.TRT_RTX: # type: ignore
-        backend = Backend.TRT_RTX()
+    if isinstance(backend, type):
+        backend = _default_backends.get(backend, backend) # type: ignore
 
     backend = copy.deepcopy(backend)
 
@@ -2628,6 +3189,10 @@ def _inference(
 
     if not path_is_serialization:
         network_path = typing.cast(str, network_path)
+
+        if isinstance(backend, (Backend.OV_CPU, Backend.ORT_CPU)) and backend.int8:
+            network_path = f"{os.path.splitext(network_path)[0]}.int8.onnx"
+
         if not os.path.exists(network_path):
             raise RuntimeError(
                 f'"{network_path}" not found, '
@@ -2644,6 +3209,9 @@ def _inference(
             raise ValueError('"path_is_serialization" must be False for migx backend')
         elif isinstance(backend, Backend.TRT_RTX):
             raise ValueError('"path_is_serialization" must be False for trt_rtx backend')
+        elif isinstance(backend, (Backend.OV_CPU, Backend.ORT_CPU)) and backend.int8:
+            # the pre-quantized network is looked up by file name
+            raise ValueError('"path_is_serialization" must be False for int8 inference')
 
     if not isinstance(batch_size, int) or batch_size < 1:
         raise ValueError('"batch_size" must be a positve integer')
@@ -2738,6 +3306,18 @@ def _inference(
         if "output_format" in core.ncnn.Model.signature:
             kwargs["output_format"] = backend.output_format
 
+    if isinstance(backend, (Backend.ORT_CPU, Backend.ORT_CUDA)):
+        if "graph_optimization_level" in core.ort.Model.signature:
+            kwargs["graph_optimization_level"] = backend.graph_optimization_level
+
+        if "enable_cpu_mem_arena" in core.ort.Model.signature:
+            kwargs["enable_cpu_mem_arena"] = backend.enable_cpu_mem_arena
+            kwargs["enable_mem_pattern"] = backend.enable_mem_pattern
+
+    if isinstance(backend, Backend.ORT_CUDA):
+        if "arena_extend_strategy" in core.ort.Model.signature:
+            kwargs["arena_extend_strategy"] = backend.arena_extend_strategy
+
     if isinstance(backend, Backend.ORT_CPU):
         ret = core.ort.Model(
             clips, network_path,
@@ -2783,6 +3363,10 @@ def _inference(
         if version >= (1, 18, 0):
             kwargs["prefer_nhwc"] = backend.prefer_nhwc
             kwargs["tf32"] = backend.tf32
+        elif backend.prefer_nhwc or backend.tf32:
+            import logging
+            logger = logging.getLogger("vsmlrt")
+            logger.warning('"prefer_nhwc" and "tf32" require onnxruntime 1.18+ and are ignored')
 
         ret = core.ort.Model(
             clips, network_path,
@@ -2812,16 +3396,19 @@ def _inference(
                 config_dict["INFERENCE_PRECISION_HINT"] = "bf16"
             else:
                 config_dict["INFERENCE_PRECISION_HINT"] = "f32"
-
-            config = lambda: config_dict
         else:
-            config = lambda: dict(
+            config_dict = dict(
                 CPU_THROUGHPUT_STREAMS=backend.num_streams,
                 CPU_BIND_THREAD="YES" if backend.bind_thread else "NO",
                 CPU_THREADS_NUM=backend.num_threads,
                 ENFORCE_BF16="YES" if backend.bf16 else "NO"
             )
 
+        if backend.cache_dir is not None:
+            config_dict["CACHE_DIR"] = backend.cache_dir
+
+        config = lambda: config_dict
+
         ret = core.ov.Model(
             clips, network_path,
             device="CPU", builtin=False,
@@ -2842,13 +3429,16 @@ def _inference(
                 config_dict["INFERENCE_PRECISION_HINT"] = "f16"
             else:
                 config_dict["INFERENCE_PRECISION_HINT"] = "f32"
-
-            config = lambda: config_dict
         else:
-            config = lambda: dict(
+            config_dict = dict(
                 GPU_THROUGHPUT_STREAMS=backend.num_streams
             )
 
+        if backend.cache_dir is not None:
+            config_dict["CACHE_DIR"] = backend.cache_dir
+
+        config = lambda: config_dict
+
         ret = core.ov.Model(
             clips, network_path,
             device=f"GPU.{backend.device_id}", builtin=False,
@@ -1017,6 +1017,30 @@ static void VS_CC vsOrtCreate(
         return set_error("\"num_streams\" must be positive");
     }
 
+    auto graph_optimization_level = static_cast<GraphOptimizationLevel>(
+        vsapi->propGetInt(in, "graph_optimization_level", 0, &error)
+    );
+    if (error) {
+        graph_optimization_level = ORT_ENABLE_ALL;
+    }
+    if (graph_optimization_level != ORT_DISABLE_ALL &&
+        graph_optimization_level != ORT_ENABLE_BASIC &&
+        graph_optimization_level != ORT_ENABLE_EXTENDED &&
+        graph_optimization_level != ORT_ENABLE_ALL
+    ) {
+        return set_error("\"graph_optimization_level\" must be 0, 1, 2 or 99");
+    }
+
+    bool enable_cpu_mem_arena = !!(vsapi->propGetInt(in, "enable_cpu_mem_arena", 0, &error));
+    if (error) {
+        enable_cpu_mem_arena = true;
+    }
+
+    bool enable_mem_pattern = !!(vsapi->propGetInt(in, "enable_mem_pattern", 0, &error));
+    if (error) {
+        enable_mem_pattern = false;
+    }
+
 #ifdef ENABLE_CUDA
     bool cudnn_benchmark = !!(vsapi->propGetInt(in, "cudnn_benchmark", 0, &error));
     if (error) {
@@ -1034,6 +1058,16 @@ static void VS_CC vsOrtCreate(
     if (error) {
         tf32 = false;
     }
+
+    const char * arena_extend_strategy = vsapi->propGetData(in, "arena_extend_strategy", 0, &error);
+    if (error) {
+        arena_extend_strategy = "kSameAsRequested";
+    }
+    if (strcmp(arena_extend_strategy, "kNextPowerOfTwo") != 0 &&
+        strcmp(arena_extend_strategy, "kSameAsRequested") != 0
+    ) {
+        return set_error("\"arena_extend_strategy\" must be \"kNextPowerOfTwo\" or \"kSameAsRequested\"");
+    }
 #endif // ENABLE_CUDA
 
     if (auto err = ortInit(); err.has_value()) {
@@ -1055,6 +1089,9 @@ static void VS_CC vsOrtCreate(
     if (error) {
         use_cuda_graph = false;
     }
+    if (use_cuda_graph && enable_mem_pattern) {
+        return set_error("\"enable_mem_pattern\" is not supported with \"use_cuda_graph\"");
+    }
 #endif // ENABLE_CUDA
 
     int output_format = int64ToIntS(vsapi->propGetInt(in, "output_format", 0, &error));
@@ -1183,8 +1220,12 @@ static void VS_CC vsOrtCreate(
             session_options,
             ExecutionMode::ORT_SEQUENTIAL
         ));
+        checkError(ortapi->SetSessionGraphOptimizationLevel(
+            session_options,
+            graph_optimization_level
+        ));
 
-        // it is important to disable the memory pattern optimization
+        // the memory pattern optimization is disabled by default
         // for use in vapoursynth
         //
         // this optimization merges memory allocation calls, but it is useless
@@ -1192,7 +1233,19 @@ static void VS_CC vsOrtCreate(
         //
         // it also prevents the use of cuda graphs which requires a static
         // memory configuration
-        checkError(ortapi->DisableMemPattern(session_options));
+        if (enable_mem_pattern) {
+            checkError(ortapi->EnableMemPattern(session_options));
+        } else {
+            checkError(ortapi->DisableMemPattern(session_options));
+        }
+
+        // the cpu memory arena keeps freed blocks for reuse, which may hold
+        // much more memory than needed when many sessions are created
+        if (enable_cpu_mem_arena) {
+            checkError(ortapi->EnableCpuMemArena(session_options));
+        } else {
+            checkError(ortapi->DisableCpuMemArena(session_options));
+        }
 
         // TODO: other providers
 #ifdef ENABLE_CUDA
@@ -1230,7 +1283,7 @@ static void VS_CC vsOrtCreate(
                 device_id_str.c_str(),
                 "EXHAUSTIVE",
                 "1",
-                "kSameAsRequested",
+                arena_extend_strategy,
                 "0",
 #if ORT_API_VERSION >= 17
                 "0",
@@ -1450,6 +1503,10 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         "output_format:int:opt;"
         "tf32:int:opt;"
         "flexible_output_prop:data:opt;"
+        "graph_optimization_level:int:opt;"
+        "enable_cpu_mem_arena:int:opt;"
+        "enable_mem_pattern:int:opt;"
+        "arena_extend_strategy:data:opt;"
 #ifdef ENABLE_COREML
         "ml_program:int:opt;"
 #endif //ENABLE_COREML